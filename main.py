@@ -11,28 +11,32 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, Response
-from pydantic import BaseModel, Field
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from typing import Optional, Literal
 from datetime import datetime, date
 import uuid
-import stripe
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+import socket
+import time
 import io
 import httpx
-from bs4 import BeautifulSoup
+from redis import asyncio as aioredis
 import asyncio
+from functools import lru_cache
 import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-import json
+import orjson
+import re
+import numpy as np
+from numba import njit
 
 # Configuration
 app = FastAPI(
     title="Dossier Immo Pro API", 
     version="1.0.0",
-    description="API d'évaluation de dossiers de prêt immobilier français"
+    description="API d'évaluation de dossiers de prêt immobilier français",
+    default_response_class=ORJSONResponse
 )
 # --- UI minimal: static & templates mounting ---
 try:
@@ -44,8 +48,17 @@ except Exception:
 templates = Jinja2Templates(directory="templates")
 # --- end UI minimal ---
 
-# Configuration Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "sk_test_default")
+# Scraping planifié des taux: RUN_SCHEDULER=0 ou WORKER_ID != 0 l'exclut,
+# sinon un verrou Redis désigne un seul worker (uvicorn --workers N)
+RUN_SCHEDULER = os.getenv("RUN_SCHEDULER", "1") == "1" and os.getenv("WORKER_ID", "0") == "0"
+
+# Configuration Stripe (import différé au premier paiement)
+@lru_cache(maxsize=None)
+def get_stripe():
+    """Retourne le module stripe configuré"""
+    import stripe
+    stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "sk_test_default")
+    return stripe
 
 # Configuration CORS
 allowed_origins = [
@@ -85,27 +98,132 @@ taux_storage = {
     "source": "seloger.com"
 }
 
-applications_store = {}
+# === STOCKAGE DOSSIERS (REDIS) ===
+
+# Identifiant du processus détenteur des verrous Redis
+LOCK_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+# Suppression d'un verrou uniquement par son détenteur
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Durée de conservation d'un dossier dans Redis (30 jours par défaut)
+APPLICATION_TTL = int(os.getenv("APPLICATION_TTL", 30 * 24 * 3600))
+
+class StorageService:
+    """Stockage partagé entre workers (Redis, mémoire locale en dev)"""
+    
+    client = None
+    _memory = {}
+    
+    @classmethod
+    async def connect(cls):
+        """Connexion Redis si REDIS_URL est défini"""
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            logger.warning("REDIS_URL non défini: stockage local au worker")
+            return
+        cls.client = aioredis.Redis.from_url(redis_url, decode_responses=True)
+        await cls.client.ping()
+        logger.info("✅ Connecté à Redis")
+    
+    @classmethod
+    async def close(cls):
+        """Ferme la connexion Redis"""
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+    
+    @classmethod
+    async def _set(cls, key: str, value: bytes, ttl: Optional[int] = None):
+        if cls.client is None:
+            cls._memory[key] = value
+        else:
+            await cls.client.set(key, value, ex=ttl)
+    
+    @classmethod
+    async def _get(cls, key: str) -> Optional[str]:
+        if cls.client is None:
+            return cls._memory.get(key)
+        return await cls.client.get(key)
+    
+    @classmethod
+    async def save_application(cls, application_id: str, record: dict):
+        """Enregistre un dossier (JSON)"""
+        await cls._set(f"app:{application_id}", orjson.dumps(record), ttl=APPLICATION_TTL)
+        if cls.client is not None:
+            # Index des dossiers actifs, score = date d'expiration
+            await cls.client.zadd("apps", {application_id: time.time() + APPLICATION_TTL})
+    
+    @classmethod
+    async def get_application(cls, application_id: str) -> Optional[dict]:
+        """Récupère un dossier, None si inconnu"""
+        raw = await cls._get(f"app:{application_id}")
+        return orjson.loads(raw) if raw is not None else None
+    
+    @classmethod
+    async def count_applications(cls) -> int:
+        """Nombre de dossiers stockés"""
+        if cls.client is None:
+            return sum(1 for key in cls._memory if key.startswith("app:"))
+        await cls.client.zremrangebyscore("apps", "-inf", time.time())
+        return await cls.client.zcard("apps")
+    
+    @classmethod
+    async def acquire_lock(cls, key: str, ttl: int) -> bool:
+        """Prend un verrou pour ttl secondes, False s'il est déjà pris"""
+        if cls.client is None:
+            return True
+        return bool(await cls.client.set(f"lock:{key}", LOCK_OWNER, nx=True, ex=ttl))
+    
+    @classmethod
+    async def release_lock(cls, key: str):
+        """Libère un verrou pris par ce processus"""
+        if cls.client is not None:
+            await cls.client.eval(RELEASE_LOCK_SCRIPT, 1, f"lock:{key}", LOCK_OWNER)
+    
+    @classmethod
+    async def save_taux(cls, taux: dict):
+        """Publie les taux pour les autres workers"""
+        await cls._set("taux", orjson.dumps(taux))
+    
+    @classmethod
+    async def load_taux(cls) -> Optional[dict]:
+        """Lit les taux publiés, None si absents"""
+        raw = await cls._get("taux")
+        return orjson.loads(raw) if raw is not None else None
 
 # === MODÈLES PYDANTIC ===
 
 class ProjectInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     property_price: float = Field(..., gt=0, description="Prix du bien")
     property_type: Literal["neuf", "ancien"] = Field(..., description="Type de bien")
     personal_contribution: float = Field(..., ge=0, description="Apport personnel")
     loan_duration: int = Field(..., ge=5, le=30, description="Durée en années")
 
 class EmploymentInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     status: Literal["cdi", "cdd"] = Field(..., description="Statut emploi")
     net_monthly_income: float = Field(..., gt=0, description="Revenus nets mensuels")
     years_experience: float = Field(..., ge=0, description="Ancienneté en années")
     trial_period: bool = Field(default=False, description="En période d'essai")
 
 class BorrowerInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     employment: EmploymentInfo
     age: int = Field(..., ge=18, le=80, description="Âge de l'emprunteur")
 
 class HouseholdInfo(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     borrowers_count: Literal[1, 2] = Field(..., description="Nombre d'emprunteurs")
     main_borrower: BorrowerInfo = Field(..., description="Emprunteur principal")
     co_borrower: Optional[BorrowerInfo] = Field(default=None, description="Co-emprunteur")
@@ -117,8 +235,11 @@ class HousingInfo(BaseModel):
     current_mortgage: float = Field(default=0, ge=0, description="Mensualité crédit actuel")
     changing_main_residence: bool = Field(default=True, description="Change de résidence principale")
 
+class ConsumerLoan(BaseModel):
+    monthly_payment: float = Field(default=0, ge=0, description="Mensualité du crédit")
+
 class FinancialInfo(BaseModel):
-    consumer_loans: list[dict] = Field(default=[], description="Crédits à la consommation")
+    consumer_loans: list[ConsumerLoan] = Field(default=[], description="Crédits à la consommation")
     rental_income: float = Field(default=0, ge=0, description="Revenus locatifs mensuels")
     other_income: float = Field(default=0, ge=0, description="Autres revenus")
 
@@ -128,6 +249,9 @@ class LoanApplication(BaseModel):
     housing: HousingInfo
     financial: FinancialInfo
 
+# Validation de dossiers bruts (dicts stockés, traitements par lot)
+LOAN_ADAPTER = TypeAdapter(LoanApplication)
+
 class ScoringResult(BaseModel):
     application_id: str
     feasibility_score: int
@@ -146,92 +270,214 @@ class PaymentRequest(BaseModel):
 
 # === SERVICE TAUX SELOGER ===
 
+# Taux affichés sur SeLoger avec leur durée, ex: "20 ans : 3,16 %"
+RATE_RE = re.compile(r"(\d{2})\s*ans\D{0,40}?(\d[,.]\d{2})\s*%")
+RATE_DURATIONS = ("10", "15", "20", "25", "30")
+
+DEFAULT_TAUX = {
+    "10": 0.0285,  # 2,85%
+    "15": 0.0303,  # 3,03%
+    "20": 0.0316,  # 3,16%
+    "25": 0.0326,  # 3,26%
+    "30": 0.0340   # 3,40%
+}
+
+# Taux retenu pour une durée absente du barème
+DEFAULT_RATE = 0.035
+
 class TauxService:
     
     @staticmethod
-    async def scrape_seloger_rates():
-        """Scrape les taux SeLoger"""
-        try:
-            url = "https://www.seloger.com/credit-immobilier/simulateur-capacite-demprunt/"
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers={
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                })
-                
-                if response.status_code != 200:
-                    raise Exception(f"Erreur HTTP: {response.status_code}")
-                
-                # Pour l'instant, on utilise des taux fixes
-                # TODO: Adapter selon la structure HTML réelle de SeLoger
-                taux_scraped = {
-                    "10": 0.0285,  # 2,85%
-                    "15": 0.0303,  # 3,03%
-                    "20": 0.0316,  # 3,16%
-                    "25": 0.0326,  # 3,26%
-                    "30": 0.0340   # 3,40%
-                }
-                
-                logger.info(f"Taux récupérés: {taux_scraped}")
-                
-                return {
-                    "date_maj": datetime.now().isoformat(),
-                    "taux": taux_scraped,
-                    "source": "seloger.com"
-                }
-                
-        except Exception as e:
-            logger.error(f"Erreur scraping SeLoger: {e}")
+    def parse_rates(html: str) -> Optional[dict]:
+        """Extrait les taux par durée, None si la page n'est pas reconnue"""
+        rates = TauxService._match_rates(html)
+        if rates is None:
+            # Taux éclatés entre plusieurs balises: on passe par le DOM
+            from bs4 import BeautifulSoup
+            soup = BeautifulSoup(html, "lxml")
+            rates = TauxService._match_rates(soup.get_text(" "))
+        return rates
+    
+    @staticmethod
+    def _match_rates(text: str) -> Optional[dict]:
+        """Associe chaque taux à la durée qui le précède"""
+        rates = {}
+        for duration, value in RATE_RE.findall(text):
+            if duration in RATE_DURATIONS:
+                rates.setdefault(duration, float(value.replace(",", ".")) / 100)
+        
+        if len(rates) != len(RATE_DURATIONS) or not all(0.005 < r < 0.10 for r in rates.values()):
+            return None
+        return {duration: rates[duration] for duration in RATE_DURATIONS}
+    
+    @staticmethod
+    def parse_seloger_rates(html: str) -> dict:
+        """Taux SeLoger, taux fixes si la page n'est pas reconnue"""
+        taux_scraped = TauxService.parse_rates(html)
+        if taux_scraped is None:
+            # Une des cinq durées introuvable ou taux hors plage: barème fixe
+            logger.warning("Taux SeLoger non reconnus, taux fixes utilisés")
+            taux_scraped = dict(DEFAULT_TAUX)
+        return taux_scraped
+    
+    @staticmethod
+    async def _scrape(source_url: str, parser) -> dict:
+        """Télécharge une page de taux et l'analyse avec le parser fourni"""
+        response = await app.state.http.get(source_url)
+        
+        if response.status_code != 200:
+            raise Exception(f"Erreur HTTP: {response.status_code}")
+        
+        return parser(response.text)
+    
+    @staticmethod
+    async def scrape_rates() -> dict:
+        """Scrape toutes les sources en parallèle et fusionne les taux"""
+        results = await asyncio.gather(
+            *(TauxService._scrape(url, parser) for _, url, parser in RATE_SOURCES),
+            return_exceptions=True
+        )
+        
+        taux_scraped = {}
+        sources = []
+        for (name, _, _), result in zip(RATE_SOURCES, results):
+            if isinstance(result, Exception):
+                logger.error(f"Erreur scraping {name}: {result}")
+                continue
+            # Priorité à la première source listée pour chaque durée
+            for duration, rate in result.items():
+                taux_scraped.setdefault(duration, rate)
+            sources.append(name)
+        
+        if not sources:
             # Taux par défaut en cas d'erreur
             return {
                 "date_maj": datetime.now().isoformat(),
-                "taux": {
-                    "10": 0.0285, "15": 0.0303, "20": 0.0316, 
-                    "25": 0.0326, "30": 0.0340
-                },
+                "taux": dict(DEFAULT_TAUX),
                 "source": "fallback"
             }
+        
+        logger.info(f"Taux récupérés: {taux_scraped}")
+        
+        return {
+            "date_maj": datetime.now().isoformat(),
+            "taux": taux_scraped,
+            "source": ", ".join(sources)
+        }
     
     @staticmethod
     async def update_monthly_rates():
         """Mise à jour mensuelle des taux"""
         try:
-            logger.info("Début mise à jour taux SeLoger...")
+            logger.info("Début mise à jour taux...")
             
-            new_rates = await TauxService.scrape_seloger_rates()
+            new_rates = await TauxService.scrape_rates()
             
             global taux_storage
             taux_storage = new_rates
+            await StorageService.save_taux(new_rates)
             
             logger.info(f"✅ Taux mis à jour: {new_rates}")
             
         except Exception as e:
             logger.error(f"❌ Erreur mise à jour taux: {e}")
     
+    @staticmethod
+    async def acquire_rates_leadership() -> bool:
+        """Un seul worker scrape les taux à la fois"""
+        if not RUN_SCHEDULER:
+            return False
+        # Le TTL couvre le scraping (timeout 30 s) si le worker meurt avant de libérer
+        return await StorageService.acquire_lock("update_taux", ttl=120)
+    
+    @staticmethod
+    async def scheduled_update() -> bool:
+        """Mise à jour planifiée, exécutée par le worker élu uniquement"""
+        if not await TauxService.acquire_rates_leadership():
+            return False
+        try:
+            await TauxService.update_monthly_rates()
+        finally:
+            await StorageService.release_lock("update_taux")
+        return True
+    
+    @staticmethod
+    async def load_shared_rates():
+        """Recharge les taux publiés par le worker planificateur"""
+        try:
+            shared_rates = await StorageService.load_taux()
+            if shared_rates:
+                global taux_storage
+                taux_storage = shared_rates
+                return True
+            # Aucun taux publié (worker élu arrêté en cours de scraping): on reprend
+            return await TauxService.scheduled_update()
+        except Exception as e:
+            logger.error(f"❌ Erreur lecture taux partagés: {e}")
+        return False
+    
+    @staticmethod
+    async def wait_for_shared_rates(timeout: float = 45.0, interval: float = 1.0):
+        """Attend que le worker élu publie ses taux (démarrage)"""
+        if StorageService.client is None:
+            # Sans Redis, aucun autre processus ne peut publier de taux
+            await TauxService.load_shared_rates()
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not await TauxService.load_shared_rates():
+            if loop.time() >= deadline:
+                logger.warning("Taux partagés absents, taux locaux conservés")
+                return
+            await asyncio.sleep(interval)
+    
     @staticmethod
     def get_current_rate(duration: int) -> float:
         """Récupère le taux actuel selon la durée"""
-        try:
-            return taux_storage["taux"].get(str(duration), 0.035)
-        except:
-            return 0.035
+        return taux_storage.get("taux", {}).get(str(duration), DEFAULT_RATE)
     
     @staticmethod
     def get_taux_info() -> dict:
         """Retourne les informations sur les taux"""
         return taux_storage
 
+# Sources scrapées en parallèle: (nom, url, parser)
+RATE_SOURCES = [
+    ("seloger.com", "https://www.seloger.com/credit-immobilier/simulateur-capacite-demprunt/", TauxService.parse_seloger_rates),
+]
+
 # === SERVICE SCORING ===
 
+# Frais de notaire selon le type de bien
+NOTARY_RATE = {"neuf": 0.03, "ancien": 0.08}
+
+# Part des revenus CDD retenue (3 ans d'ancienneté minimum)
+CDD_ELIGIBILITY_FACTOR = 0.7
+
+# Poids des critères: apport, revenus, endettement, reste à vivre, âge
+CRITERIA_WEIGHTS = np.array([30, 20, 30, 10, 10])
+
+@njit(cache=True, fastmath=True)
+def _pmt(amount: float, duration_years: int, rate: float) -> float:
+    """Mensualité d'un prêt à taux fixe (compilé par Numba)"""
+    monthly_rate = rate / 12
+    n_payments = duration_years * 12
+    if monthly_rate == 0:
+        return amount / n_payments
+    growth = (1 + monthly_rate) ** n_payments
+    return amount * monthly_rate * growth / (growth - 1)
+
+@lru_cache(maxsize=4096)
+def _pmt_cached(amount_cents: int, duration_years: int, rate: float) -> float:
+    """Mensualité mémoïsée (montant en centimes, taux exact)"""
+    return _pmt(amount_cents / 100, duration_years, rate)
+
 class LoanScoringService:
     
     @staticmethod
     def calculate_notary_fees(price: float, property_type: str) -> float:
         """Calcule les frais de notaire"""
-        if property_type == "neuf":
-            return price * 0.03
-        else:
-            return price * 0.08
+        return price * NOTARY_RATE[property_type]
     
     @staticmethod
     def get_current_interest_rate(loan_duration: int) -> float:
@@ -243,12 +489,18 @@ class LoanScoringService:
         """Calcule mensualité"""
         if rate is None:
             rate = LoanScoringService.get_current_interest_rate(duration_years)
-            
-        monthly_rate = rate / 12
-        n_payments = duration_years * 12
-        if monthly_rate == 0:
-            return amount / n_payments
-        return amount * (monthly_rate * (1 + monthly_rate)**n_payments) / ((1 + monthly_rate)**n_payments - 1)
+        return _pmt_cached(round(amount * 100), int(duration_years), float(rate))
+    
+    @staticmethod
+    def calculate_monthly_payment_array(amount: float, durations: np.ndarray, rates: np.ndarray) -> np.ndarray:
+        """Calcule les mensualités d'une grille durées × taux (broadcasting NumPy)"""
+        monthly_rates = np.asarray(rates, dtype=np.float64) / 12
+        n_payments = np.asarray(durations, dtype=np.float64) * 12
+        growth = (1 + monthly_rates) ** n_payments
+        with np.errstate(divide="ignore", invalid="ignore"):
+            payments = amount * monthly_rates * growth / (growth - 1)
+        # Taux nul: remboursement linéaire
+        return np.where(monthly_rates == 0, amount / n_payments, payments)
     
     @staticmethod
     def calculate_eligible_income(employment: EmploymentInfo) -> float:
@@ -261,7 +513,7 @@ class LoanScoringService:
             return base_income
         elif employment.status == "cdd":
             if employment.years_experience >= 3:
-                return base_income * 0.7
+                return base_income * CDD_ELIGIBILITY_FACTOR
             return 0
         return 0
     
@@ -275,8 +527,7 @@ class LoanScoringService:
         elif housing.current_status == "proprietaire" and housing.changing_main_residence:
             charges += housing.current_mortgage
         
-        for loan in financial.consumer_loans:
-            charges += loan.get('monthly_payment', 0)
+        charges += sum(loan.monthly_payment for loan in financial.consumer_loans)
         
         return charges
     
@@ -294,8 +545,8 @@ class LoanScoringService:
         return main_income + co_income + rental_income_eligible + financial.other_income
     
     @classmethod
-    def evaluate_application(cls, application: LoanApplication) -> ScoringResult:
-        """Évalue la faisabilité du dossier"""
+    def evaluate_application(cls, application: LoanApplication) -> dict:
+        """Évalue la faisabilité du dossier (champs de ScoringResult)"""
         
         # Calculs de base
         notary_fees = cls.calculate_notary_fees(
@@ -309,7 +560,8 @@ class LoanScoringService:
         total_income = cls.calculate_total_eligible_income(application.household, application.financial)
         
         # Mensualité
-        current_rate = cls.get_current_interest_rate(application.project.loan_duration)
+        taux_info = TauxService.get_taux_info()
+        current_rate = float(taux_info.get("taux", {}).get(str(application.project.loan_duration), DEFAULT_RATE))
         monthly_payment = cls.calculate_monthly_payment(loan_amount, application.project.loan_duration, current_rate)
         
         # Charges actuelles
@@ -320,52 +572,57 @@ class LoanScoringService:
         min_remaining = household_size * 750
         
         # Évaluation critères
+        min_contribution = total_budget * 0.10
+        main_income = cls.calculate_eligible_income(application.household.main_borrower.employment)
+        total_charges = monthly_payment + current_charges
+        debt_ratio = (total_charges / total_income) if total_income > 0 else 1
+        remaining = total_income - total_charges
+        loan_end_age = application.household.main_borrower.age + application.project.loan_duration
+        
+        checks = np.array([
+            application.project.personal_contribution >= min_contribution,
+            main_income > 0,
+            debt_ratio <= 0.33,
+            remaining >= min_remaining,
+            loan_end_age <= 64,
+        ])
+        score = int(checks @ CRITERIA_WEIGHTS)
+        contribution_ok, income_ok, debt_ok, remaining_ok, age_ok = checks
+        
         criteria = {}
-        score = 0
         recommendations = []
         
         # Critère apport (30%)
-        min_contribution = total_budget * 0.10
-        if application.project.personal_contribution >= min_contribution:
+        if contribution_ok:
             criteria["apport"] = "✅ Apport suffisant"
-            score += 30
         else:
             criteria["apport"] = f"❌ Apport insuffisant ({min_contribution:.0f}€ minimum)"
             recommendations.append(f"Augmentez votre apport à {min_contribution:.0f}€ minimum")
         
         # Critère revenus (20%)
-        main_income = cls.calculate_eligible_income(application.household.main_borrower.employment)
-        if main_income > 0:
+        if income_ok:
             criteria["revenus"] = f"✅ Revenus éligibles : {total_income:,.0f}€/mois"
-            score += 20
         else:
             criteria["revenus"] = "❌ Revenus non éligibles"
             recommendations.append("Obtenez un CDI ou justifiez 3 ans d'ancienneté en CDD")
         
         # Critère endettement (30%)
-        total_charges = monthly_payment + current_charges
-        debt_ratio = (total_charges / total_income) if total_income > 0 else 1
-        if debt_ratio <= 0.33:
+        if debt_ok:
             criteria["endettement"] = f"✅ Taux d'endettement : {debt_ratio:.1%}"
-            score += 30
         else:
             criteria["endettement"] = f"❌ Taux d'endettement trop élevé : {debt_ratio:.1%}"
             recommendations.append("Réduisez vos charges ou augmentez vos revenus")
         
         # Critère reste à vivre (10%)
-        remaining = total_income - total_charges
-        if remaining >= min_remaining:
+        if remaining_ok:
             criteria["reste_vivre"] = f"✅ Reste à vivre : {remaining:.0f}€"
-            score += 10
         else:
             criteria["reste_vivre"] = f"❌ Reste à vivre insuffisant : {remaining:.0f}€"
             recommendations.append(f"Assurez-vous d'avoir {min_remaining:.0f}€ de reste à vivre")
         
         # Critère âge (10%)
-        loan_end_age = application.household.main_borrower.age + application.project.loan_duration
-        if loan_end_age <= 64:
+        if age_ok:
             criteria["age"] = f"✅ Fin de crédit à {loan_end_age} ans"
-            score += 10
         else:
             criteria["age"] = f"❌ Fin de crédit à {loan_end_age} ans (limite 64 ans)"
             recommendations.append("Réduisez la durée du prêt")
@@ -378,148 +635,189 @@ class LoanScoringService:
         else:
             status = "difficile"
         
-        taux_info = TauxService.get_taux_info()
-        
-        return ScoringResult(
-            application_id=str(uuid.uuid4()),
-            feasibility_score=score,
-            status=status,
-            criteria_details=criteria,
-            recommendations=recommendations,
-            monthly_payment=monthly_payment,
-            total_budget=total_budget,
-            current_interest_rate=current_rate,
-            rate_source=taux_info.get("source", "seloger.com"),
-            rate_last_update=taux_info.get("date_maj", "Non disponible")
-        )
+        return {
+            "application_id": str(uuid.uuid4()),
+            "feasibility_score": score,
+            "status": status,
+            "criteria_details": criteria,
+            "recommendations": recommendations,
+            "monthly_payment": monthly_payment,
+            "total_budget": total_budget,
+            "current_interest_rate": current_rate,
+            "rate_source": taux_info.get("source", "seloger.com"),
+            "rate_last_update": taux_info.get("date_maj", "Non disponible")
+        }
+
+    @classmethod
+    def warm_up(cls):
+        """Compile _pmt et exécute une évaluation fictive"""
+        _pmt(100000.0, 20, 0.03)
+        cls.evaluate_application(LOAN_ADAPTER.validate_python({
+            "project": {
+                "property_price": 250000, "property_type": "ancien",
+                "personal_contribution": 30000, "loan_duration": 20
+            },
+            "household": {
+                "borrowers_count": 1, "children": 0,
+                "main_borrower": {
+                    "age": 35,
+                    "employment": {"status": "cdi", "net_monthly_income": 3500, "years_experience": 5}
+                }
+            },
+            "housing": {"current_status": "locataire"},
+            "financial": {}
+        }))
 
 # === SERVICE PDF ===
 
+PDF_CHUNK_SIZE = 64 * 1024
+
 class PDFService:
     
     @staticmethod
-    def generate_loan_dossier(application: LoanApplication, scoring: ScoringResult) -> bytes:
-        """Génère le PDF du dossier"""
-        buffer = io.BytesIO()
+    def generate_loan_dossier(buffer: io.BufferedIOBase, application: LoanApplication, scoring: ScoringResult) -> None:
+        """Génère le PDF du dossier dans le fichier fourni"""
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        
         p = canvas.Canvas(buffer, pagesize=A4)
         width, height = A4
         
-        # En-tête
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, height - 50, "DOSSIER DE PRÊT IMMOBILIER")
-        
-        # Informations taux
-        y = height - 80
-        p.setFont("Helvetica", 10)
-        p.drawString(50, y, f"Taux ({scoring.rate_source}): {scoring.current_interest_rate:.2%}")
-        y -= 15
-        p.drawString(50, y, f"Mise à jour: {scoring.rate_last_update[:10]}")
-        
-        # Score
-        y -= 40
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, y, f"Score: {scoring.feasibility_score}/100 - {scoring.status.upper()}")
-        
-        # Projet
-        y -= 40
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "PROJET IMMOBILIER")
-        y -= 20
-        
-        p.setFont("Helvetica", 10)
-        p.drawString(50, y, f"Prix: {application.project.property_price:,.0f} €")
-        y -= 15
-        p.drawString(50, y, f"Budget total: {scoring.total_budget:,.0f} €")
-        y -= 15
-        p.drawString(50, y, f"Mensualité: {scoring.monthly_payment:,.0f} €/mois")
-        
-        # Critères
-        y -= 30
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "CRITÈRES D'ÉVALUATION")
-        y -= 20
-        
-        p.setFont("Helvetica", 10)
+        heading = ("Helvetica-Bold", 12)
+        body = ("Helvetica", 10)
+        
+        # Mise en page: (décalage vertical avant la ligne, police, texte)
+        lines = [
+            # En-tête
+            (0, ("Helvetica-Bold", 16), "DOSSIER DE PRÊT IMMOBILIER"),
+            # Informations taux
+            (30, body, f"Taux ({scoring.rate_source}): {scoring.current_interest_rate:.2%}"),
+            (15, body, f"Mise à jour: {scoring.rate_last_update[:10]}"),
+            # Score
+            (40, ("Helvetica-Bold", 14), f"Score: {scoring.feasibility_score}/100 - {scoring.status.upper()}"),
+            # Projet
+            (40, heading, "PROJET IMMOBILIER"),
+            (20, body, f"Prix: {application.project.property_price:,.0f} €"),
+            (15, body, f"Budget total: {scoring.total_budget:,.0f} €"),
+            (15, body, f"Mensualité: {scoring.monthly_payment:,.0f} €/mois"),
+            # Critères
+            (30, heading, "CRITÈRES D'ÉVALUATION"),
+        ]
+        
+        dy = 35
         for criterion, result in scoring.criteria_details.items():
-            y -= 15
-            p.drawString(50, y, f"{criterion.replace('_', ' ').title()}: {result}")
+            lines.append((dy, body, f"{criterion.replace('_', ' ').title()}: {result}"))
+            dy = 15
         
         # Recommandations
         if scoring.recommendations:
-            y -= 30
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(50, y, "RECOMMANDATIONS")
-            y -= 20
-            
-            p.setFont("Helvetica", 10)
+            lines.append((30, heading, "RECOMMANDATIONS"))
+            dy = 35
             for i, rec in enumerate(scoring.recommendations, 1):
-                y -= 15
-                p.drawString(50, y, f"{i}. {rec}")
+                lines.append((dy, body, f"{i}. {rec}"))
+                dy = 15
+        
+        # Un seul objet texte pour toute la page
+        text = p.beginText()
+        y = height - 50
+        font = None
+        for dy, line_font, line in lines:
+            y -= dy
+            if line_font != font:
+                text.setFont(*line_font)
+                font = line_font
+            text.setTextOrigin(50, y)
+            text.textOut(line)
+        p.drawText(text)
         
         p.save()
-        buffer.seek(0)
-        return buffer.getvalue()
 
 # === SCHEDULER ===
 
-scheduler = AsyncIOScheduler()
+scheduler = AsyncIOScheduler(job_defaults={
+    "coalesce": True,
+    "misfire_grace_time": 3600,
+    "max_instances": 1
+})
+
+# Horodatage partagé, rafraîchi chaque seconde (évite un datetime.now() par requête)
+app.state.now = datetime.now()
 
-# Mise à jour le 1er de chaque mois à 9h
+async def refresh_clock():
+    """Met à jour l'horodatage lu par les endpoints (tâche de fond)"""
+    while True:
+        app.state.now = datetime.now()
+        await asyncio.sleep(1)
+
+# Mise à jour le 1er de chaque mois à 9h (un seul worker élu)
 scheduler.add_job(
-    TauxService.update_monthly_rates,
+    TauxService.scheduled_update,
     CronTrigger(day=1, hour=9, minute=0),
     id='update_taux_mensuel',
     replace_existing=True
 )
 
+# Tous les workers relisent les taux publiés chaque heure
+scheduler.add_job(
+    TauxService.load_shared_rates,
+    CronTrigger(minute=5),
+    id='sync_taux_partages',
+    replace_existing=True
+)
+
 # === ENDPOINTS ===
 
+_HTML_LANDING = """
+<html>
+    <head>
+        <title>Dossier Immo Pro API</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 40px; background: #f5f5f5; }
+            .container { max-width: 600px; margin: 0 auto; background: white; padding: 40px; border-radius: 10px; }
+            h1 { color: #3b82f6; }
+            .status { background: #ecfdf5; padding: 15px; border-radius: 8px; margin: 20px 0; }
+            a { color: #3b82f6; text-decoration: none; }
+            a:hover { text-decoration: underline; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>🏠 Dossier Immo Pro API</h1>
+            <p>API d'évaluation de dossiers de prêt immobilier français</p>
+            
+            <div class="status">
+                <strong>✅ API Opérationnelle</strong><br>
+                Service d'évaluation de faisabilité de crédit immobilier
+            </div>
+            
+            <h3>🔗 Liens utiles :</h3>
+            <ul>
+                <li><a href="/docs">📖 Documentation API</a></li>
+                <li><a href="/api/health">💚 Health Check</a></li>
+                <li><a href="/api/taux-actuels">📊 Taux actuels</a></li>
+                <li><a href="/api/status">🔍 Status détaillé</a></li>
+            </ul>
+            
+            <p><em>Version 1.0.0 - Prêt pour le déploiement</em></p>
+        </div>
+    </body>
+</html>
+"""
+
+# Page statique: rendue une seule fois au chargement du module
+ROOT_RESPONSE = HTMLResponse(content=_HTML_LANDING)
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     """Page d'accueil"""
-    return """
-    <html>
-        <head>
-            <title>Dossier Immo Pro API</title>
-            <style>
-                body { font-family: Arial, sans-serif; margin: 40px; background: #f5f5f5; }
-                .container { max-width: 600px; margin: 0 auto; background: white; padding: 40px; border-radius: 10px; }
-                h1 { color: #3b82f6; }
-                .status { background: #ecfdf5; padding: 15px; border-radius: 8px; margin: 20px 0; }
-                a { color: #3b82f6; text-decoration: none; }
-                a:hover { text-decoration: underline; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1>🏠 Dossier Immo Pro API</h1>
-                <p>API d'évaluation de dossiers de prêt immobilier français</p>
-                
-                <div class="status">
-                    <strong>✅ API Opérationnelle</strong><br>
-                    Service d'évaluation de faisabilité de crédit immobilier
-                </div>
-                
-                <h3>🔗 Liens utiles :</h3>
-                <ul>
-                    <li><a href="/docs">📖 Documentation API</a></li>
-                    <li><a href="/api/health">💚 Health Check</a></li>
-                    <li><a href="/api/taux-actuels">📊 Taux actuels</a></li>
-                    <li><a href="/api/status">🔍 Status détaillé</a></li>
-                </ul>
-                
-                <p><em>Version 1.0.0 - Prêt pour le déploiement</em></p>
-            </div>
-        </body>
-    </html>
-    """
+    return ROOT_RESPONSE
 
 @app.get("/api/health")
 async def health_check():
     """Endpoint de santé"""
     return {
         "status": "ok",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": app.state.now,
         "environment": os.getenv("ENVIRONMENT", "production"),
         "taux_source": taux_storage.get("source"),
         "taux_last_update": taux_storage.get("date_maj", "Non disponible")[:10]
@@ -534,7 +832,7 @@ async def status():
         "environment": os.getenv("ENVIRONMENT"),
         "stripe_configured": bool(os.getenv("STRIPE_SECRET_KEY")),
         "taux_data": taux_storage,
-        "active_applications": len(applications_store)
+        "active_applications": await StorageService.count_applications()
     }
 
 @app.get("/api/taux-actuels")
@@ -554,13 +852,12 @@ async def evaluate_loan_application(application: LoanApplication):
     try:
         scoring_result = LoanScoringService.evaluate_application(application)
         
-        # Stockage temporaire
-        applications_store[scoring_result.application_id] = {
-            "application": application,
+        await StorageService.save_application(scoring_result["application_id"], {
+            "application": application.model_dump(mode="json"),
             "scoring": scoring_result,
-            "created_at": datetime.now(),
+            "created_at": app.state.now,
             "paid": False
-        }
+        })
         
         return scoring_result
         
@@ -571,10 +868,10 @@ async def evaluate_loan_application(application: LoanApplication):
 async def create_payment_intent(payment_request: PaymentRequest):
     """Crée un intent de paiement Stripe"""
     try:
-        if payment_request.application_id not in applications_store:
+        if await StorageService.get_application(payment_request.application_id) is None:
             raise HTTPException(status_code=404, detail="Dossier non trouvé")
         
-        intent = stripe.PaymentIntent.create(
+        intent = get_stripe().PaymentIntent.create(
             amount=payment_request.amount,
             currency='eur',
             metadata={'application_id': payment_request.application_id}
@@ -589,13 +886,15 @@ async def create_payment_intent(payment_request: PaymentRequest):
 async def confirm_payment(application_id: str, payment_intent_id: str):
     """Confirme le paiement"""
     try:
-        if application_id not in applications_store:
+        app_data = await StorageService.get_application(application_id)
+        if app_data is None:
             raise HTTPException(status_code=404, detail="Dossier non trouvé")
         
-        intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        intent = get_stripe().PaymentIntent.retrieve(payment_intent_id)
         
         if intent.status == "succeeded":
-            applications_store[application_id]["paid"] = True
+            app_data["paid"] = True
+            await StorageService.save_application(application_id, app_data)
             return {"status": "success", "message": "Paiement confirmé"}
         else:
             raise HTTPException(status_code=400, detail="Paiement non confirmé")
@@ -607,11 +906,10 @@ async def confirm_payment(application_id: str, payment_intent_id: str):
 async def get_complete_dossier(application_id: str):
     """Récupère le dossier complet après paiement"""
     try:
-        if application_id not in applications_store:
+        app_data = await StorageService.get_application(application_id)
+        if app_data is None:
             raise HTTPException(status_code=404, detail="Dossier non trouvé")
         
-        app_data = applications_store[application_id]
-        
         if not app_data["paid"]:
             raise HTTPException(status_code=402, detail="Paiement requis")
         
@@ -627,23 +925,29 @@ async def get_complete_dossier(application_id: str):
 async def download_pdf(application_id: str):
     """Télécharge le PDF du dossier"""
     try:
-        if application_id not in applications_store:
+        app_data = await StorageService.get_application(application_id)
+        if app_data is None:
             raise HTTPException(status_code=404, detail="Dossier non trouvé")
         
-        app_data = applications_store[application_id]
-        
         if not app_data["paid"]:
             raise HTTPException(status_code=402, detail="Paiement requis")
         
-        pdf_content = PDFService.generate_loan_dossier(
-            app_data["application"], 
-            app_data["scoring"]
+        buffer = io.BytesIO()
+        PDFService.generate_loan_dossier(
+            buffer,
+            LOAN_ADAPTER.validate_python(app_data["application"]), 
+            ScoringResult.model_validate(app_data["scoring"])
         )
+        buffer.seek(0)
         
-        return Response(
-            content=pdf_content,
+        # Blocs de 64 Ko plutôt que l'itération ligne par ligne du BytesIO
+        return StreamingResponse(
+            iter(lambda: buffer.read(PDF_CHUNK_SIZE), b""),
             media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=dossier_pret_immobilier.pdf"}
+            headers={
+                "Content-Disposition": "attachment; filename=dossier_pret_immobilier.pdf",
+                "Content-Length": str(buffer.getbuffer().nbytes)
+            }
         )
         
     except Exception as e:
@@ -655,8 +959,24 @@ async def download_pdf(application_id: str):
 async def startup_event():
     """Démarrage"""
     logger.info("🚀 Démarrage Dossier Immo Pro API")
+    # Client HTTP partagé (keep-alive + HTTP/2) pour le scraping
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        limits=httpx.Limits(max_keepalive_connections=10),
+        headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    )
+    await StorageService.connect()
+    if int(os.getenv("WEB_CONCURRENCY", 1)) > 1 and StorageService.client is None:
+        # Chaque worker aurait ses propres dossiers et scraperait les taux
+        logger.error("❌ WEB_CONCURRENCY > 1 nécessite REDIS_URL")
+        raise RuntimeError("Plusieurs workers sans Redis: définir REDIS_URL ou WEB_CONCURRENCY=1")
+    app.state.clock_task = asyncio.create_task(refresh_clock())
     scheduler.start()
-    await TauxService.update_monthly_rates()
+    if not await TauxService.scheduled_update():
+        await TauxService.wait_for_shared_rates()
+    # Compilation Numba avant la première requête
+    LoanScoringService.warm_up()
     logger.info("✅ API prête")
 
 @app.on_event("shutdown")
@@ -664,6 +984,9 @@ async def shutdown_event():
     """Arrêt"""
     logger.info("🛑 Arrêt Dossier Immo Pro API")
     scheduler.shutdown()
+    app.state.clock_task.cancel()
+    await StorageService.close()
+    await app.state.http.aclose()
 # --- UI minimal: /app route ---
 @app.get("/app", response_class=HTMLResponse)
 def ui_app(request: Request):
@@ -674,4 +997,15 @@ def ui_app(request: Request):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1 and not os.getenv("REDIS_URL"):
+        # Sans Redis, dossiers et verrous restent locaux à chaque worker
+        logger.warning("REDIS_URL non défini: démarrage avec un seul worker")
+        workers = 1
+        os.environ["WEB_CONCURRENCY"] = "1"
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers
+    )